@@ -2,80 +2,362 @@
 
 """Module implementing folder synchronisation mechanism"""
 
-import datetime
-import filecmp
+import collections
+import concurrent.futures
+import contextlib
+import errno
+import hashlib
+import itertools
+import json
 import os
+import queue
 import shutil
+import subprocess
 import sys
-from typing import List
+import tempfile
+import threading
+import time
+from typing import (
+    Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+)
 
 
 __author__ = "Joaquim Leitão"
 __email__ = "jocaleitao93@gmail.com"
 
 
-def _write_to_log(log_file_path: str, message: str) -> None:
+# Copy and delete operations are I/O-bound, hence more workers than available CPUs are used
+_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Up to this number of copy/delete operations in a folder, these are carried out sequentially, as
+# dispatching them to the pool of worker threads costs more than it saves
+_MAX_SEQUENTIAL_OPERATIONS = 2
+
+# Exceptions raised by failed copy/delete operations, which are logged without stopping the
+# synchronisation of other files/folders
+_FILE_OPERATION_ERRORS = (FileNotFoundError, OSError, PermissionError, shutil.SameFileError)
+
+# Paths of files/folders inside the (absolute, normalised) folders being synchronised are built by
+# plain concatenation, which is cheaper than os.path.join
+_SEP = os.sep
+
+_PRINT_LOCK = threading.Lock()
+
+_LOG_BUFFER_SIZE = 1 << 16
+
+# The thread writing to the log file does so in batches of up to this number of lines, flushing the
+# file when no new lines arrive within the given timeout (in seconds)
+_LOG_BATCH_SIZE = 256
+_LOG_FLUSH_TIMEOUT = 0.05
+
+# Last second (since the epoch) for which a log timestamp was formatted, and its formatted string
+_last_log_timestamp = (-1, "")
+
+# Maximum number of bytes requested from the kernel in each copy_file_range/sendfile call
+_COPY_CHUNK_SIZE = 2 ** 30
+
+# Errors signalling that a kernel-side copy is not supported for a given pair of files
+_KERNEL_COPY_UNSUPPORTED_ERRNOS = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP}
+
+# Name of the file, stored next to the log file, caching the state of the folders found to be in
+# sync by the previous synchronisation. The version must be bumped whenever the format of the
+# cache changes, so that caches written by previous versions are discarded
+_CACHE_FILE_NAME = ".folder_sync_cache.json"
+_CACHE_VERSION = 3
+
+# Folders modified less than this amount of time before the synchronisation started are not
+# cached, since further changes within the timestamp granularity of the file system would not
+# change their modification time
+_CACHE_MIN_AGE_NS = 2 * 10 ** 9
+
+# Cached state of a pair of folders: (device, inode, modification time) of the source and replica
+# folders, names of the files common to both folders, digest of their (size, modification time)
+# (the same on both sides, as the folders were in sync), and common sub-folders
+_CacheEntry = Tuple[Tuple[int, int, int], Tuple[int, int, int], Tuple[str, ...], bytes, List[str]]
+
+
+class _FolderComparison(NamedTuple):
+    """
+    Result of comparing a source folder and a replica folder (see _dircmp_fast)
     """
-    Appends a provided message to a log file in a given location.
-    :param log_file_path: Path to the log file
+    left_only: List[str]
+    right_only: List[str]
+    diff_files: List[str]
+    common_dirs: List[str]
+    file_signatures: Dict[str, Tuple[int, int]]
+
+
+def _format_timestamp() -> str:
+    """
+    Formats the current local time as "YYYY-MM-DD HH:MM:SS.ffffff". The date and time part is only
+    formatted once per second, and reused for all the log messages written during that second.
+    :return: The formatted current time
+    """
+    global _last_log_timestamp  # pylint: disable=global-statement
+    now = time.time()
+    now_sec = int(now)
+    last_sec, last_sec_str = _last_log_timestamp
+    if now_sec != last_sec:
+        last_sec_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_sec))
+        _last_log_timestamp = (now_sec, last_sec_str)
+    return f"{last_sec_str}.{int((now - now_sec) * 1e6):06d}"
+
+
+def _write_to_log(log_queue: queue.Queue, message: str) -> None:
+    """
+    Appends a provided message to a log file, by handing it to the thread writing to the file.
+    :param log_queue: Queue of the lines to be written to the log file
     :param message: The messaged to the appended to the log file
     """
-    with open(log_file_path, "a", encoding="utf-8") as fp:
-        fp.write(f"[{datetime.datetime.now()}] {message}\n")
+    log_queue.put_nowait(f"[{_format_timestamp()}] {message}\n")
+
+
+def _log_writer(log_queue: queue.Queue, log_fp: TextIO, errors: List[Exception]) -> None:
+    """
+    Writes the lines handed through a queue to an open log file, until None is received. Lines are
+    written in batches, and the file is flushed whenever no new lines arrive for a short while,
+    so that logging does not block the synchronisation itself. If writing to the file fails, the
+    error is reported on the standard error output and stored, and the remaining lines are
+    discarded.
+    :param log_queue: Queue of the lines to be written to the log file
+    :param log_fp: File object of the log file
+    :param errors: List where the error raised while writing to the log file, if any, is stored
+    """
+    lines = []
+    end_of_log = False
+    while not end_of_log:
+        flush = False
+        try:
+            line = log_queue.get(timeout=_LOG_FLUSH_TIMEOUT)
+            if line is None:
+                end_of_log = flush = True
+            else:
+                lines.append(line)
+        except queue.Empty:
+            flush = True
 
+        if errors:
+            # Writing to the log file already failed, discard the remaining lines
+            lines = []
+            continue
+
+        try:
+            if flush or len(lines) >= _LOG_BATCH_SIZE:
+                log_fp.writelines(lines)
+                lines = []
+            if flush:
+                log_fp.flush()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Any error must be handed over to the synchronisation, as it ends this thread
+            sys.stderr.write(f"Exception while writing to the log file: {e}\n")
+            errors.append(e)
 
-def _custom_print(log_file_path: str, message: str) -> None:
+
+def _custom_print(log_queue: queue.Queue, message: str) -> None:
     """
     Custom implementation of a print function, making sure that the desired message is not only
-    printed to the console output, but also to the provided log file
-    :param log_file_path: Path to the log file
+    printed to the console output, but also to the provided log file. The (timestamped) line is
+    formatted once and written as-is to both. Calls are serialised, so that messages from
+    concurrent copy/delete operations are not interleaved
+    :param log_queue: Queue of the lines to be written to the log file
     :param message: The message to be printed and logged to the file
     """
-    print(message)
-    _write_to_log(log_file_path, message)
+    with _PRINT_LOCK:
+        line = f"[{_format_timestamp()}] {message}\n"
+        sys.stdout.write(line)
+        log_queue.put_nowait(line)
+
+
+def _kernel_copy(source_fd: int, replica_fd: int) -> bool:
+    """
+    Copies the contents of a file into another one without moving the data through user space,
+    using os.copy_file_range and, if it is not supported, os.sendfile.
+    :param source_fd: File descriptor of the file to be copied
+    :param replica_fd: File descriptor of the (empty) file where the contents are copied to
+    :return: True, if the contents were copied, otherwise False (neither of the system calls is
+             supported for the provided files, and nothing was written)
+    :raises:
+        OSError: If the copy fails after some data has already been written
+    """
+    copy_functions = (
+        lambda offset: os.copy_file_range(
+            source_fd, replica_fd, _COPY_CHUNK_SIZE, offset, offset
+        ),
+        lambda offset: os.sendfile(replica_fd, source_fd, offset, _COPY_CHUNK_SIZE)
+    )
+    for copy_function in copy_functions:
+        offset = 0
+        try:
+            while True:
+                copied = copy_function(offset)
+                if copied == 0:
+                    return True
+                offset += copied
+        except OSError as e:
+            if offset != 0 or e.errno not in _KERNEL_COPY_UNSUPPORTED_ERRNOS:
+                raise
+    return False
+
+
+def _fast_copy2(source_path: str, replica_path: str) -> None:
+    """
+    Equivalent of shutil.copy2, which copies the contents of the file in kernel space whenever
+    possible (falling back to shutil.copy2 otherwise), and then copies the file metadata.
+    :param source_path: The path to the file to be copied
+    :param replica_path: The path to which the file should be copied
+    :raises:
+        shutil.SameFileError: If both paths refer to the same file
+    """
+    if not hasattr(os, "copy_file_range"):
+        shutil.copy2(source_path, replica_path)
+        return
+
+    with open(source_path, "rb") as source_fp:
+        replica_fd = os.open(replica_path, os.O_WRONLY | os.O_CREAT, 0o666)
+        try:
+            # Only truncate the replica file after making sure it is not the source file itself
+            source_stat = os.fstat(source_fp.fileno())
+            replica_stat = os.fstat(replica_fd)
+            if (source_stat.st_dev, source_stat.st_ino) == \
+                    (replica_stat.st_dev, replica_stat.st_ino):
+                raise shutil.SameFileError(
+                    f"{source_path!r} and {replica_path!r} are the same file"
+                )
+            os.ftruncate(replica_fd, 0)
+            copied = _kernel_copy(source_fp.fileno(), replica_fd)
+        finally:
+            os.close(replica_fd)
+
+    if copied:
+        shutil.copystat(source_path, replica_path)
+    else:
+        shutil.copy2(source_path, replica_path)
+
+
+def _copy_location(
+        source_path: str,
+        replica_path: str,
+        is_dir: bool,
+        log_queue: queue.Queue
+) -> None:
+    """
+    Copies a single file or folder from the source folder to the replica folder.
+    :param source_path: The path to the file/folder in the source folder
+    :param replica_path: The path to the file/folder in the replica folder
+    :param is_dir: Whether <source_path> corresponds to a folder
+    :param log_queue: Queue of the lines to be written to the log file
+    """
+    if is_dir:
+        # If "source_path" corresponds to a directory, then this will be the relative path
+        # to a newly created directory, which does not exist in the replica folder (only
+        # modified files appear in "diff_files", and those will be processed in the
+        # else statement). Nevertheless, if indeed a case occurs where the folder already
+        # exists in the replica folder, then the version from the source folder should be
+        # kept, hence calling shutil.copytree with "dirs_exist_ok=True"
+        _custom_print(log_queue, f"Copying folder from {source_path} to {replica_path}")
+        shutil.copytree(source_path, replica_path, dirs_exist_ok=True)
+    else:
+        _custom_print(log_queue, f"Copying file from {source_path} to {replica_path}")
+        _fast_copy2(source_path, replica_path)
+
+
+def _rmtree(folder_path: str) -> None:
+    """
+    Deletes a folder and all its contents, through shutil.rmtree. A symbolic link to a folder is
+    deleted itself, and never followed.
+    :param folder_path: The path to the folder to be deleted
+    """
+    if os.path.islink(folder_path):
+        os.unlink(folder_path)
+        return
+
+    shutil.rmtree(folder_path)
+
+
+def _delete_location(location_path: str, is_dir: bool, log_queue: queue.Queue) -> None:
+    """
+    Deletes a single file or folder from the replica folder.
+    :param location_path: The path to the file/folder to be deleted
+    :param is_dir: Whether <location_path> corresponds to a folder
+    :param log_queue: Queue of the lines to be written to the log file
+    """
+    if is_dir:
+        _custom_print(log_queue, f"Deleting folder {location_path}")
+        _rmtree(location_path)
+    else:
+        _custom_print(log_queue, f"Deleting file {location_path}")
+        os.remove(location_path)
+
+
+def _run_operations(
+        operation: Callable[..., None],
+        operations_args: List[tuple],
+        executor: concurrent.futures.Executor
+) -> List[Optional[Exception]]:
+    """
+    Runs a copy/delete operation for each of the provided sets of arguments, concurrently in the
+    provided pool of worker threads. If there are only a few operations, they are instead
+    carried out sequentially, in the calling thread.
+    :param operation: The function carrying out the operation
+    :param operations_args: List with the arguments of each operation
+    :param executor: Pool of worker threads where the operations are carried out
+    :return: List with the exception raised by each operation, or None if it succeeded
+    """
+    errors = []
+    if len(operations_args) <= _MAX_SEQUENTIAL_OPERATIONS:
+        for args in operations_args:
+            try:
+                operation(*args)
+                errors.append(None)
+            except _FILE_OPERATION_ERRORS as e:
+                errors.append(e)
+        return errors
+
+    futures = [executor.submit(operation, *args) for args in operations_args]
+    for future in futures:
+        try:
+            future.result()
+            errors.append(None)
+        except _FILE_OPERATION_ERRORS as e:
+            errors.append(e)
+    return errors
 
 
 def _copy_new_modified_files(
         source_folder_path: str,
         replica_folder_path: str,
-        paths_list: List[str],
-        log_file_path: str
+        paths_list: Iterable[str],
+        log_queue: queue.Queue,
+        executor: concurrent.futures.Executor
 ) -> bool:
     """
     Copies both (i) new files/folders added to the source folder, and (ii) files modified in the
     source folder, since the last synchronisation, to the replica folder. If any copy operation
     fails, it is appropriately logged in the provided log file.
+    The copy operations are carried out concurrently, in the provided pool of worker threads.
     :param source_folder_path: The path to the source folder
     :param replica_folder_path: The path to the replica folder
-    :param paths_list: List of names of the newly created or modified files and folders, in the
-                       source folder
-    :param log_file_path: Path to a file where the logs of the aforementioned operations will be
-                          carried out
+    :param paths_list: Iterable with the names of the newly created or modified files and folders,
+                       in the source folder
+    :param log_queue: Queue of the lines to be written to the log file, where the aforementioned
+                      operations will be logged
+    :param executor: Pool of worker threads where the copy operations are carried out
     :return: True, if all the actions were performed successfully, otherwise False
     """
-    return_val = True
+    path_names = []
+    copy_args = []
     for path_name in paths_list:
-        try:
-            source_path = os.path.join(source_folder_path, path_name)
-            replica_path = os.path.join(replica_folder_path, path_name)
-
-            # Copy from "source_path" to "replica_path"
-            if os.path.isdir(source_path):
-                # If "source_path" corresponds to a directory, then this will be the relative path
-                # to a newly created directory, which does not exist in the replica folder (only
-                # modified files appear in dircmp.diff_files, and those will be processed in the
-                # else statement). Nevertheless, if indeed a case occurs where the folder already
-                # exists in the replica folder, then the version from the source folder should be
-                # kept, hence calling shutil.copytree with "dirs_exist_ok=True"
-                _custom_print(log_file_path, f"Copying folder from {source_path} to {replica_path}")
-                shutil.copytree(source_path, replica_path, dirs_exist_ok=True)
-            else:
-                _custom_print(log_file_path, f"Copying file from {source_path} to {replica_path}")
-                shutil.copy2(source_path, replica_path)
-        except (FileNotFoundError, OSError, PermissionError, shutil.SameFileError) as e:
+        source_path = f"{source_folder_path}{_SEP}{path_name}"
+        replica_path = f"{replica_folder_path}{_SEP}{path_name}"
+        path_names.append(path_name)
+        copy_args.append((source_path, replica_path, os.path.isdir(source_path), log_queue))
+
+    return_val = True
+    for path_name, error in zip(path_names, _run_operations(_copy_location, copy_args, executor)):
+        if error is not None:
             _custom_print(
-                log_file_path,
-                f"Exception while copying modified file/folder {path_name}: {e}"
+                log_queue,
+                f"Exception while copying modified file/folder {path_name}: {error}"
             )
             return_val = False
 
@@ -85,7 +367,8 @@ def _copy_new_modified_files(
 def _delete_locations(
         folder_root_path: str,
         sub_folder_names: List[str],
-        log_file_path: str
+        log_queue: queue.Queue,
+        executor: concurrent.futures.Executor
 ) -> bool:
     """
     Deletes a specified set of files/folders, which are all contained inside a given root
@@ -93,32 +376,501 @@ def _delete_locations(
     synchronisation, and which, therefore, must also be deleted on the replica folder.
     For each folder deleted, a new line in the provided log file is added, documenting the action
     performed. If any deletion fails, it is appropriately logged in the provided log file.
+    The deletions are carried out concurrently, in the provided pool of worker threads.
     :param folder_root_path: Path to the root location of all the folders to be deleted
     :param sub_folder_names: List with the names of the folders to be deleted
-    :param log_file_path: Path to a file where the log of the aforementioned folder deletion
-                          actions will be carried out
+    :param log_queue: Queue of the lines to be written to the log file, where the aforementioned
+                      folder deletion actions will be logged
+    :param executor: Pool of worker threads where the deletions are carried out
     :return: True, if all the actions were performed successfully, otherwise False
     """
+    delete_args = []
+    for sub_folder_name in sub_folder_names:
+        curr_subfolder_name = f"{folder_root_path}{_SEP}{sub_folder_name}"
+        # Symbolic links to folders are deleted as files, so that their targets are left untouched
+        is_dir = os.path.isdir(curr_subfolder_name) and not os.path.islink(curr_subfolder_name)
+        delete_args.append((curr_subfolder_name, is_dir, log_queue))
+
     # Delete each folder only on the replica/target folder
+    errors = _run_operations(_delete_location, delete_args, executor)
+
     return_val = True
-    for sub_folder_name in sub_folder_names:
-        try:
-            curr_subfolder_name = os.path.join(folder_root_path, sub_folder_name)
-            if os.path.isdir(curr_subfolder_name):
-                _custom_print(log_file_path, f"Deleting folder {curr_subfolder_name}")
-                shutil.rmtree(curr_subfolder_name)
-            else:
-                _custom_print(log_file_path, f"Deleting file {curr_subfolder_name}")
-                os.remove(curr_subfolder_name)
-        except (FileNotFoundError, OSError, PermissionError, shutil.SameFileError) as e:
+    for sub_folder_name, error in zip(sub_folder_names, errors):
+        if error is not None:
             _custom_print(
-                log_file_path,
-                f"Exception during file/folder deletion {sub_folder_name}: {e}"
+                log_queue,
+                f"Exception during file/folder deletion {sub_folder_name}: {error}"
             )
             return_val = False
     return return_val
 
 
+@contextlib.contextmanager
+def _open_folder(folder_path: str) -> Iterator[Union[int, str]]:
+    """
+    Opens a folder for listing its contents. Where supported, a file descriptor of the folder is
+    used, so that the entries returned by os.scandir are stat'ed relative to it (fstatat) instead
+    of having their full path resolved again by the kernel.
+    :param folder_path: The path to the folder
+    :return: Either a file descriptor of the folder or its path, to be passed to os.scandir
+    """
+    if os.scandir not in os.supports_fd:
+        yield folder_path
+        return
+
+    folder_fd = os.open(folder_path, os.O_RDONLY)
+    try:
+        yield folder_fd
+    finally:
+        os.close(folder_fd)
+
+
+def _copy_entire_folder(
+        source_folder_path: str,
+        replica_folder_path: str,
+        log_queue: queue.Queue
+) -> None:
+    """
+    Copies an entire source folder to a replica folder which does not exist yet. The copy is
+    delegated to the platform's native tool - robocopy on Windows, and cp on other platforms -
+    falling back to shutil.copytree if the tool is not available or fails.
+    :param source_folder_path: The path to the source folder
+    :param replica_folder_path: The path to the (non-existing) replica folder
+    :param log_queue: Queue of the lines to be written to the log file
+    """
+    if sys.platform == "win32":
+        # Robocopy exit codes below 8 signal success (with or without files copied)
+        command = [
+            "robocopy", "/NFL", "/NDL", "/NJH", "/NJS", "/NP", "/E",
+            source_folder_path, replica_folder_path
+        ]
+        max_success_code = 7
+    else:
+        # Symbolic links are dereferenced, as done by shutil.copytree
+        command = [
+            "cp", "-R", "-L", "-p", f"{source_folder_path}{os.sep}.", replica_folder_path
+        ]
+        max_success_code = 0
+
+    try:
+        result = subprocess.run(
+            command, check=False, capture_output=True, text=True, errors="replace"
+        )
+        if result.returncode <= max_success_code:
+            return
+        error = f"exit code {result.returncode}: {result.stderr.strip()}"
+    except OSError as e:
+        error = str(e)
+
+    _custom_print(
+        log_queue,
+        f"Native copy of folder {source_folder_path} failed ({error}). "
+        f"Copying it with shutil.copytree instead"
+    )
+    # The native tool may have partially copied the folder
+    shutil.copytree(source_folder_path, replica_folder_path, dirs_exist_ok=True)
+
+
+def _scan_folder(folder: Union[int, str]) -> Dict[str, os.DirEntry]:
+    """
+    Lists the contents of a given folder in a single pass.
+    :param folder: The path to the folder to be listed, or a file descriptor of the folder
+    :return: Dictionary mapping the name of each entry in the folder to its os.DirEntry
+    """
+    with os.scandir(folder) as it:
+        return {entry.name: entry for entry in it}
+
+
+def _compare_common_entries(
+        entry_pairs: List[Tuple[os.DirEntry, os.DirEntry]]
+) -> Tuple[List[str], List[str], Dict[str, Tuple[int, int]]]:
+    """
+    Compares the entries with the same name in a source folder and a replica folder. As when
+    copying them, symbolic links are followed. Entries which are a folder on one side and a file
+    on the other, or which cannot be stat'ed (e.g. broken symbolic links), are ignored.
+    :param entry_pairs: List with the (source, replica) pairs of entries with the same name
+    :return: Tuple with (i) the names of the files which differ between both folders, (ii) the
+             names of the sub-folders common to both folders and (iii) a dictionary mapping the
+             name of each file common to both folders to its size and modification time in the
+             source folder
+    """
+    diff_files = []
+    common_dirs = []
+    file_signatures = {}
+    for source_entry, replica_entry in entry_pairs:
+        is_dir = source_entry.is_dir()
+        if is_dir != replica_entry.is_dir():
+            continue
+        if is_dir:
+            common_dirs.append(source_entry.name)
+            continue
+
+        try:
+            source_stat = source_entry.stat()
+            replica_stat = replica_entry.stat()
+        except OSError:
+            continue
+        file_signatures[source_entry.name] = (source_stat.st_size, source_stat.st_mtime_ns)
+        if file_signatures[source_entry.name] != (replica_stat.st_size, replica_stat.st_mtime_ns):
+            diff_files.append(source_entry.name)
+
+    return diff_files, common_dirs, file_signatures
+
+
+def _dircmp_fast(
+        source_folder_path: str,
+        replica_folder_path: str
+) -> _FolderComparison:
+    """
+    Compares the contents of a source folder and a replica folder, similarly to filecmp.dircmp,
+    but relying on the information cached in the os.DirEntry objects returned by os.scandir. The
+    type of each entry is known from the directory listing itself (only symbolic links, which are
+    followed, need to be stat'ed), and only files present in both folders are stat'ed. As in a
+    shallow file comparison, files are deemed different if their size or modification time
+    differ. Entries which are a folder on one side and a file on the other are ignored.
+    :param source_folder_path: The path to the source folder
+    :param replica_folder_path: The path to the replica folder
+    :return: Tuple with the names of (i) the entries only in the source folder, (ii) the entries
+             only in the replica folder, (iii) the files which differ between both folders,
+             (iv) the sub-folders common to both folders and (v) a dictionary mapping the name of
+             each file common to both folders to its size and modification time in the source
+             folder
+    """
+    with _open_folder(source_folder_path) as source_folder, \
+            _open_folder(replica_folder_path) as replica_folder:
+        source_entries = _scan_folder(source_folder)
+        replica_entries = _scan_folder(replica_folder)
+
+        source_names = set(source_entries)
+        replica_names = set(replica_entries)
+        left_only = sorted(source_names.difference(replica_names))
+        right_only = sorted(replica_names.difference(source_names))
+
+        diff_files, common_dirs, file_signatures = _compare_common_entries(
+            [
+                (source_entries[name], replica_entries[name])
+                for name in sorted(source_names.intersection(replica_names))
+            ]
+        )
+
+    return _FolderComparison(left_only, right_only, diff_files, common_dirs, file_signatures)
+
+
+def _stat_files(folder_path: str, file_names: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """
+    Retrieves the size and modification time of a set of files in a given folder, without listing
+    the contents of the folder.
+    :param folder_path: The path to the folder
+    :param file_names: The names of the files
+    :return: Dictionary mapping the name of each file to its size and modification time
+    :raises:
+        FileNotFoundError: If any of the files does not exist
+    """
+    file_signatures = {}
+    with _open_folder(folder_path) as folder:
+        dir_fd = folder if isinstance(folder, int) else None
+        for name in file_names:
+            file_path = name if dir_fd is not None else os.path.join(folder_path, name)
+            stat_result = os.stat(file_path, dir_fd=dir_fd)
+            file_signatures[name] = (stat_result.st_size, stat_result.st_mtime_ns)
+    return file_signatures
+
+
+def _signatures_digest(file_signatures: Dict[str, Tuple[int, int]]) -> bytes:
+    """
+    Computes a digest of the names, sizes and modification times of a set of files.
+    :param file_signatures: Dictionary mapping the name of each file to its size and modification
+                            time
+    :return: The digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, (size, mtime_ns) in file_signatures.items():
+        digest.update(os.fsencode(name))
+        digest.update(f"\0{size}\0{mtime_ns}\0".encode("ascii"))
+    return digest.digest()
+
+
+def _compare_folders(
+        source_folder_path: str,
+        replica_folder_path: str,
+        cache_entry: Optional[_CacheEntry],
+        max_cached_mtime_ns: int
+) -> Tuple[_FolderComparison, Optional[_CacheEntry]]:
+    """
+    Compares the contents of a source folder and a replica folder (see _dircmp_fast). If no
+    entries were added, removed or renamed in either folder since they were last found to be in
+    sync, only their files are stat'ed, on both sides: if none of them was modified in either
+    folder, the folders are still in sync, otherwise they are fully compared.
+    :param source_folder_path: The path to the source folder
+    :param replica_folder_path: The path to the replica folder
+    :param cache_entry: The cached state of the folders, if they were found to be in sync by the
+                        previous synchronisation, otherwise None
+    :param max_cached_mtime_ns: Folders modified after this time (in nanoseconds) are not cached
+    :return: Tuple with (i) the result of the comparison and (ii) the state of the folders to be
+             cached for the next synchronisation, once they are synchronised, or None if it
+             cannot be cached (see _new_cache_entry)
+    """
+    folder_signatures = (
+        _folder_signature(source_folder_path), _folder_signature(replica_folder_path)
+    )
+
+    comparison_result = None
+    if cache_entry is not None and cache_entry[:2] == folder_signatures:
+        try:
+            file_signatures = _stat_files(source_folder_path, cache_entry[2])
+            if _signatures_digest(file_signatures) == cache_entry[3] and \
+                    _signatures_digest(_stat_files(replica_folder_path, cache_entry[2])) == \
+                    cache_entry[3]:
+                comparison_result = _FolderComparison([], [], [], cache_entry[4], file_signatures)
+        except OSError:
+            # A file was removed or became inaccessible in the meantime, so the folders must be
+            # fully compared
+            pass
+
+    if comparison_result is None:
+        comparison_result = _dircmp_fast(source_folder_path, replica_folder_path)
+
+    return comparison_result, _new_cache_entry(
+        folder_signatures, comparison_result, max_cached_mtime_ns
+    )
+
+
+def _new_cache_entry(
+        folder_signatures: Tuple[Tuple[int, int, int], Tuple[int, int, int]],
+        comparison_result: _FolderComparison,
+        max_cached_mtime_ns: int
+) -> Optional[_CacheEntry]:
+    """
+    Builds the state of a pair of folders to be cached for the next synchronisation. Only folders
+    which are already in sync, and which were not modified too recently, are cached.
+    :param folder_signatures: The signatures of the source and replica folders
+    :param comparison_result: The result of comparing both folders
+    :param max_cached_mtime_ns: Folders modified after this time (in nanoseconds) are not cached
+    :return: The state to be cached, or None if the folders cannot be cached
+    """
+    if comparison_result.left_only or comparison_result.right_only or \
+            comparison_result.diff_files:
+        return None
+    if max(signature[2] for signature in folder_signatures) >= max_cached_mtime_ns:
+        return None
+
+    return (
+        folder_signatures[0],
+        folder_signatures[1],
+        tuple(comparison_result.file_signatures),
+        _signatures_digest(comparison_result.file_signatures),
+        comparison_result.common_dirs
+    )
+
+
+def _folder_signature(folder_path: str) -> Tuple[int, int, int]:
+    """
+    Computes the signature of a folder, which changes whenever entries are added to, removed from
+    or renamed in the folder.
+    :param folder_path: The path to the folder
+    :return: Tuple with the device, inode and modification time (in nanoseconds) of the folder
+    """
+    stat_result = os.stat(folder_path)
+    return stat_result.st_dev, stat_result.st_ino, stat_result.st_mtime_ns
+
+
+def _parse_signature(value: Any) -> Tuple[int, int, int]:
+    """
+    Validates a folder signature read from the cache file.
+    :param value: The value read from the cache file
+    :return: The folder signature (see _folder_signature)
+    :raises:
+        ValueError: If the value is not a valid folder signature
+    """
+    if not isinstance(value, list) or len(value) != 3 or \
+            not all(isinstance(item, int) and not isinstance(item, bool) for item in value):
+        raise ValueError(f"Invalid folder signature in cache: {value!r}")
+    return value[0], value[1], value[2]
+
+
+def _parse_names(value: Any) -> List[str]:
+    """
+    Validates a list of file/folder names read from the cache file.
+    :param value: The value read from the cache file
+    :return: The list of names
+    :raises:
+        ValueError: If the value is not a list of names
+    """
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"Invalid list of names in cache: {value!r}")
+    return value
+
+
+def _parse_cache_entry(value: Any) -> _CacheEntry:
+    """
+    Validates the cached state of a pair of folders read from the cache file.
+    :param value: The value read from the cache file
+    :return: The cached state of the folders
+    :raises:
+        ValueError: If the value is not a valid cache entry
+    """
+    if not isinstance(value, dict) or not isinstance(value.get("digest"), str):
+        raise ValueError(f"Invalid cache entry: {value!r}")
+    return (
+        _parse_signature(value.get("source_signature")),
+        _parse_signature(value.get("replica_signature")),
+        tuple(_parse_names(value.get("files"))),
+        bytes.fromhex(value["digest"]),
+        _parse_names(value.get("common_dirs"))
+    )
+
+
+def _load_cache(log_dir: str) -> Dict[Tuple[str, str], Dict[str, _CacheEntry]]:
+    """
+    Loads the synchronisation cache written by a previous synchronisation. The cache file is
+    fully validated, since it may have been modified by other users.
+    :param log_dir: Path to the folder where the cache is stored (the folder of the log file)
+    :return: Dictionary mapping each pair of (source, replica) folders previously synchronised to
+             the cached state of their sub-folders, keyed by source sub-folder path. Empty if no
+             valid cache is found
+    """
+    try:
+        with open(os.path.join(log_dir, _CACHE_FILE_NAME), "r", encoding="utf-8") as fp:
+            content = json.load(fp)
+        if not isinstance(content, dict) or content.get("version") != _CACHE_VERSION or \
+                not isinstance(content.get("roots"), list):
+            return {}
+
+        cache = {}
+        for root in content["roots"]:
+            if not isinstance(root, dict) or not isinstance(root.get("source"), str) or \
+                    not isinstance(root.get("replica"), str) or \
+                    not isinstance(root.get("folders"), dict):
+                raise ValueError(f"Invalid cache root: {root!r}")
+            cache[(root["source"], root["replica"])] = {
+                folder_path: _parse_cache_entry(cache_entry)
+                for folder_path, cache_entry in root["folders"].items()
+            }
+        return cache
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(log_dir: str, cache: Dict[Tuple[str, str], Dict[str, _CacheEntry]]) -> None:
+    """
+    Stores the synchronisation cache, to be used by the next synchronisation. The cache file is
+    replaced atomically, so that concurrent synchronisations never read a partially written file.
+    :param log_dir: Path to the folder where the cache is stored (the folder of the log file)
+    :param cache: The cache to be stored (see _load_cache)
+    """
+    content = {
+        "version": _CACHE_VERSION,
+        "roots": [
+            {
+                "source": source_root_path,
+                "replica": replica_root_path,
+                "folders": {
+                    folder_path: {
+                        "source_signature": cache_entry[0],
+                        "replica_signature": cache_entry[1],
+                        "files": cache_entry[2],
+                        "digest": cache_entry[3].hex(),
+                        "common_dirs": cache_entry[4]
+                    }
+                    for folder_path, cache_entry in folders.items()
+                }
+            }
+            for (source_root_path, replica_root_path), folders in cache.items()
+        ]
+    }
+
+    # The temporary file is created with a unique name, and never through an existing path
+    temp_fd, temp_file_path = tempfile.mkstemp(prefix=_CACHE_FILE_NAME, dir=log_dir)
+    try:
+        with os.fdopen(temp_fd, "w", encoding="utf-8") as fp:
+            json.dump(content, fp)
+        os.replace(temp_file_path, os.path.join(log_dir, _CACHE_FILE_NAME))
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp_file_path)
+        raise
+
+
+def _sync_folders(
+        source_folder_path: str,
+        replica_folder_path: str,
+        log_queue: queue.Queue,
+        cache: Dict[str, _CacheEntry]
+) -> Dict[str, _CacheEntry]:
+    """
+    Synchronizes the contents of two existing folders - source folder and replica folder - and of
+    all their sub-folders. See _folder_sync for details.
+    Pairs of folders which were in sync in the previous synchronisation, and which had no entries
+    added, removed or renamed since then (on either side), are not listed again: only their files
+    are stat'ed, on both sides, and compared against a digest of their previous sizes and
+    modification times.
+    :param source_folder_path: The absolute path to the source folder
+    :param replica_folder_path: The absolute path to the replica folder
+    :param log_queue: Queue of the lines to be written to the log file, where the operations
+                      carried out during the synchronisation will be logged
+    :param cache: The cached state of the folders found to be in sync by the previous
+                  synchronisation, keyed by source folder path
+    :return: The state of the folders found to be in sync, to be cached for the next
+             synchronisation
+    """
+    new_cache = {}
+    max_cached_mtime_ns = time.time_ns() - _CACHE_MIN_AGE_NS
+
+    # Walk the folder tree iteratively, comparing each pair of source and replica folders. The copy
+    # and deletion phases of each pair of folders touch disjoint paths, so they run concurrently.
+    # A single pool of worker threads, shared by the whole synchronisation, carries out the
+    # individual copy and delete operations
+    folders_to_sync = collections.deque([(source_folder_path, replica_folder_path)])
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=_MAX_WORKERS) as file_executor:
+        while folders_to_sync:
+            source_folder_path, replica_folder_path = folders_to_sync.popleft()
+
+            comparison_result, new_cache_entry = _compare_folders(
+                source_folder_path,
+                replica_folder_path,
+                cache.get(source_folder_path),
+                max_cached_mtime_ns
+            )
+
+            # Must copy files in "left_only" and "diff_files" from source to replica
+            copy_future = executor.submit(
+                _copy_new_modified_files,
+                source_folder_path,
+                replica_folder_path,
+                itertools.chain(comparison_result.left_only, comparison_result.diff_files),
+                log_queue,
+                file_executor
+            )
+
+            # Must delete files/folders in "right_only"
+            delete_future = executor.submit(
+                _delete_locations,
+                replica_folder_path,
+                comparison_result.right_only,
+                log_queue,
+                file_executor
+            )
+
+            concurrent.futures.wait([copy_future, delete_future])
+            if not copy_future.result() or not delete_future.result():
+                # Error while copying new files to replica folder or during deletion! Skip this
+                # folder (already logged the file/folder which failed to copy or delete)
+                continue
+
+            if new_cache_entry is not None:
+                new_cache[source_folder_path] = new_cache_entry
+
+            # Need to do similar process for each folder in "common_dirs"
+            for sub_folder_name in comparison_result.common_dirs:
+                folders_to_sync.append((
+                    os.path.join(source_folder_path, sub_folder_name),
+                    os.path.join(replica_folder_path, sub_folder_name)
+                ))
+
+    return new_cache
+
+
 def _folder_sync(source_folder_path: str, replica_folder_path: str, log_file_path: str) -> None:
     """
     Synchronizes the contents of two folders - source folder and replica folder - such that the
@@ -138,51 +890,53 @@ def _folder_sync(source_folder_path: str, replica_folder_path: str, log_file_pat
     source_folder_path = os.path.abspath(source_folder_path)
     replica_folder_path = os.path.abspath(replica_folder_path)
 
-    if not os.path.exists(source_folder_path):
-        message = f"Could not find the source folder at the provided path: {source_folder_path}"
-        _write_to_log(log_file_path, f"EXCEPTION: {message}")
-        raise FileNotFoundError(message)
-
-    if not os.path.exists(replica_folder_path):
-        # Replica folder does not exist, copy it and return
-        message = f"Replica folder not found at path {replica_folder_path}. "\
-                  f"Copying entire source folder from path {source_folder_path}"
-        _custom_print(log_file_path, message)
-
-        shutil.copytree(source_folder_path, replica_folder_path)
-        return
-
-    comparison_result = filecmp.dircmp(source_folder_path, replica_folder_path)
+    # Keep the log file open (and buffered) for the whole synchronisation, with a background thread
+    # writing the logged lines to it. File names that are not valid UTF-8 are logged escaped
+    with open(
+        log_file_path, "a", buffering=_LOG_BUFFER_SIZE, encoding="utf-8", errors="backslashreplace"
+    ) as log_fp:
+        log_queue = queue.Queue()
+        log_errors = []
+        log_writer = threading.Thread(
+            target=_log_writer, args=(log_queue, log_fp, log_errors), daemon=True
+        )
+        log_writer.start()
+        try:
+            if not os.path.exists(source_folder_path):
+                message = f"Could not find the source folder at the provided path: "\
+                          f"{source_folder_path}"
+                _write_to_log(log_queue, f"EXCEPTION: {message}")
+                raise FileNotFoundError(message)
 
-    # Must copy files in "left_only" and "diff_files" from source to replica
-    _return_val  =_copy_new_modified_files(
-        source_folder_path,
-        replica_folder_path,
-        comparison_result.left_only + comparison_result.diff_files,
-        log_file_path
-    )
-    if not _return_val:
-        # Error while copying new files to replica folder!
-        # Stop execution (already logged the folder/file which failed to copy)
-        return
+            if not os.path.exists(replica_folder_path):
+                # Replica folder does not exist, copy it
+                message = f"Replica folder not found at path {replica_folder_path}. "\
+                          f"Copying entire source folder from path {source_folder_path}"
+                _custom_print(log_queue, message)
 
-    # Must delete files/folders in "right_only"
-    _return_val = _delete_locations(
-        replica_folder_path,
-        comparison_result.right_only,
-        log_file_path
-    )
-    if not _return_val:
-        # Error during deletion! Stop execution (already logged the folder which failed to delete)
-        return
+                _copy_entire_folder(source_folder_path, replica_folder_path, log_queue)
+            else:
+                # The cache is kept next to the log file, and scoped to this pair of folders
+                log_dir = os.path.dirname(os.path.abspath(log_file_path))
+                cache = _load_cache(log_dir)
+                cache_key = (source_folder_path, replica_folder_path)
+                cache[cache_key] = _sync_folders(
+                    source_folder_path, replica_folder_path, log_queue, cache.get(cache_key, {})
+                )
+                try:
+                    _save_cache(log_dir, cache)
+                except OSError as e:
+                    _custom_print(
+                        log_queue, f"Exception while saving the synchronisation cache: {e}"
+                    )
+        finally:
+            # Signal the end of the log to the writer thread, and wait for it to write all lines
+            log_queue.put(None)
+            log_writer.join()
 
-    # Need to do similar process for each folder in "common_dirs"
-    for sub_folder_name in comparison_result.common_dirs:
-        _folder_sync(
-            os.path.join(source_folder_path, sub_folder_name),
-            os.path.join(replica_folder_path, sub_folder_name),
-            log_file_path
-        )
+        if log_errors:
+            # Failing to write to the log file is an error of the synchronisation itself
+            raise log_errors[0]
 
 
 if __name__ == "__main__":
@@ -18,10 +18,8 @@ def add_job_to_crontab(command: str, interval: Any) -> None:
     # Create a new cron object for the current user
     cron = CronTab(user=True)
 
-    # Check if the job already exists
-    found_jobs = [job for job in cron if job.command == command]
-
-    if len(found_jobs) == 0:
+    # Check if the job already exists (stopping at the first match)
+    if not any(job.command == command for job in cron):
         # Create a new job and set it to the desired interval
         job = cron.new(command=command)
         job.minute.every(interval)
@@ -32,8 +30,9 @@ def add_job_to_crontab(command: str, interval: Any) -> None:
         print(f"Cron job {command} added with frequency every {interval} minutes!")
     else:
         # Change the execution frequency to all the found jobs
-        for job in found_jobs:
-            job.minute.every(interval)
+        for job in cron:
+            if job.command == command:
+                job.minute.every(interval)
 
         # Write the job to the crontab
         cron.write()
@@ -49,7 +48,8 @@ def del_job_from_crontab(command: str) -> None:
     # Create a new cron object for the current user
     cron = CronTab(user=True)
 
-    # Check if the job already exists
+    # Collect the matching jobs before removing them, since the crontab cannot be modified while
+    # iterating over it
     jobs_to_remove = [job for job in cron if job.command == command]
 
     if len(jobs_to_remove) > 0:
@@ -6,8 +6,6 @@
 import os
 import sys
 
-from folder_sync import add_job_to_crontab, del_job_from_crontab
-
 
 _MODE_ADD = "add"
 _MODE_DEL = "del"
@@ -44,11 +42,15 @@ if __name__ == "__main__":
     command_to_add = f"cd {curr_file_root_folder};"\
         f"{PYTHON_EXEC} {file_to_run} {_source_folder_path} {_replica_folder_path} {_log_file}"
 
+    # The crontab management functions are only imported once the mode is known to be valid
     if _mode.lower() == _MODE_ADD:
+        from folder_sync import add_job_to_crontab  # pylint: disable=import-outside-toplevel
         add_job_to_crontab(command_to_add, _sync_interval)
     elif _mode.lower() == _MODE_DEL:
+        from folder_sync import del_job_from_crontab  # pylint: disable=import-outside-toplevel
         del_job_from_crontab(command_to_add)
-    raise ValueError(
-        f"Invalid value assigned to <mode> argument! Expected {_MODE_ADD} or {_MODE_DEL}, "
-        f"but found: {_mode}"
-    )
+    else:
+        raise ValueError(
+            f"Invalid value assigned to <mode> argument! Expected {_MODE_ADD} or {_MODE_DEL}, "
+            f"but found: {_mode}"
+        )